@@ -5,25 +5,45 @@ Uses Claude to answer questions and edit project markdown files.
 """
 
 import os
+import re
 import time
+import asyncio
+import functools
+import heapq
+import concurrent.futures
+import shutil
 import subprocess
-from datetime import datetime, timedelta
+import tempfile
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from dotenv import load_dotenv
-from slack_bolt import App
-from slack_bolt.adapter.socket_mode import SocketModeHandler
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.aiohttp import AsyncSocketModeHandler
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
 import anthropic
 
-# Session storage: {channel_id: {"messages": [...], "last_activity": timestamp}}
+try:
+    import pygit2
+except ImportError:  # Optional: get_recent_updates falls back to the git CLI
+    pygit2 = None
+
+# Session storage: {channel_id: {"messages": deque([...]), "last_activity": timestamp}}
 SESSIONS = {}
 SESSION_TIMEOUT = 30 * 60  # 30 minutes in seconds
+SESSION_MAX_MESSAGES = 40  # Last 20 exchanges
+
+# Min-heap of (expiry_timestamp, channel_id), pushed on every session touch
+_SESSION_EXPIRY = []
 
 # Load environment variables
 load_dotenv()
 
 # Initialize clients
-app = App(token=os.environ.get("SLACK_BOT_TOKEN"))
-claude = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+app = AsyncApp(token=os.environ.get("SLACK_BOT_TOKEN"))
+claude = anthropic.AsyncAnthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
 
 # Project root directory (parent of bot folder)
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -84,6 +104,14 @@ Use Slack mrkdwn format, NOT standard markdown:
 
 Current project files will be provided as context."""
 
+# Immutable parts of the system prompt, built once at import time
+_SYSTEM_PROMPT_BLOCK = {"type": "text", "text": SYSTEM_PROMPT}
+_PROJECT_FILES_BLOCK = {"type": "text", "text": "Current project files:"}
+_NO_FILES_BLOCK = {"type": "text", "text": "No project files found."}
+
+# Anthropic allows at most 4 prompt cache breakpoints per request
+MAX_CACHE_BREAKPOINTS = 4
+
 # Tools available to the bot
 TOOLS = [
     {
@@ -126,41 +154,246 @@ TOOLS = [
 ]
 
 
-def get_all_markdown_files(allowed_dirs: list = None):
-    """Read all markdown files from the project.
+# Markdown file cache kept current by a filesystem watcher, grouped by
+# top-level directory ("" for root files): {dir: {path: content}}
+_MD_FILES = {}
+_MD_LOCK = threading.Lock()
+_MD_LOADED = False
 
-    Args:
-        allowed_dirs: List of directory names to include. None means all directories.
-    """
-    files_content = []
-
-    # Get markdown files from root (only if full access)
-    if allowed_dirs is None:
-        for md_file in PROJECT_ROOT.glob("*.md"):
-            if md_file.name != "CLAUDE.md":
-                try:
-                    content = md_file.read_text()
-                    files_content.append(f"## File: {md_file.name}\n\n{content}")
-                except Exception as e:
-                    files_content.append(f"## File: {md_file.name}\n\nError reading file: {e}")
-
-    # Get markdown files from each project directory
-    for proj_dir, proj_name in PROJECTS.items():
-        # Skip if not in allowed directories
-        if allowed_dirs is not None and proj_dir not in allowed_dirs:
-            continue
+# Size limits for markdown context: oversized files are skipped, and files past
+# the total budget are left out. ~400K characters is roughly 100K tokens, leaving
+# room in the 200K token window for the system prompt, tools and conversation.
+MAX_MARKDOWN_FILE_BYTES = 256 * 1024
+MAX_CONTEXT_CHARS = 400 * 1024
+
+# Rendered markdown sections per set of allowed directories: {dirs_key: (section, ...)}
+# Cleared whenever a watched markdown file changes
+_CTX_CACHE = {}
+
+
+def _served_dirs() -> list:
+    """Directories whose markdown is served: every project plus any directory granted to a channel."""
+    dirs = dict.fromkeys(PROJECTS)
+    for channel_dirs in CHANNEL_ACCESS.values():
+        dirs.update(dict.fromkeys(channel_dirs))
+    return list(dirs)
+
+
+def _markdown_group(path: Path):
+    """Return the _MD_FILES group for a path the bot serves as context, or None."""
+    if path.suffix != ".md":
+        return None
+    try:
+        relative_path = path.relative_to(PROJECT_ROOT)
+    except ValueError:
+        return None
+
+    # Root markdown files, or anything under a served directory
+    if len(relative_path.parts) == 1:
+        return "" if path.name != "CLAUDE.md" else None
+    return relative_path.parts[0] if relative_path.parts[0] in _served_dirs() else None
 
+
+def _read_markdown_file(path: Path) -> str:
+    """Read a markdown file, returning an error note instead of raising."""
+    try:
+        # Read the whole file with raw os.read calls and decode once, skipping the text I/O layer
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            size = os.fstat(fd).st_size
+            if size > MAX_MARKDOWN_FILE_BYTES:
+                return f"File skipped: too large to include ({size // 1024} KB)."
+            data = os.read(fd, size)
+            # os.read may return short (e.g. on network filesystems), keep going until EOF or size
+            while len(data) < size:
+                chunk = os.read(fd, size - len(data))
+                if not chunk:
+                    break
+                data += chunk
+        finally:
+            os.close(fd)
+        return data.decode("utf-8", "replace")
+    except Exception as e:
+        return f"Error reading file: {e}"
+
+
+@functools.lru_cache(maxsize=1)
+def _discover_md_files() -> tuple:
+    """Find the markdown files the bot serves as context.
+
+    Memoized so startup and the first cache load share one tree walk. The
+    markdown watcher clears it whenever files are created, deleted or moved.
+    """
+    paths = [md_file for md_file in PROJECT_ROOT.glob("*.md") if md_file.name != "CLAUDE.md"]
+    for proj_dir in _served_dirs():
         proj_path = PROJECT_ROOT / proj_dir
         if proj_path.exists():
-            for md_file in proj_path.glob("**/*.md"):
-                try:
-                    content = md_file.read_text()
-                    relative_path = md_file.relative_to(PROJECT_ROOT)
-                    files_content.append(f"## File: {relative_path} ({proj_name})\n\n{content}")
-                except Exception as e:
-                    files_content.append(f"## File: {md_file.name}\n\nError reading file: {e}")
+            paths.extend(proj_path.glob("**/*.md"))
+    return tuple(paths)
 
-    return "\n\n---\n\n".join(files_content) if files_content else "No project files found."
+
+def _load_markdown_files():
+    """Populate the markdown cache with a full scan of the project. Caller holds _MD_LOCK."""
+    global _MD_LOADED
+
+    paths = _discover_md_files()
+
+    # Reads are I/O bound, so overlap them (helps most on cold caches and network drives)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+        contents = list(executor.map(_read_markdown_file, paths))
+
+    _MD_FILES.clear()
+    _CTX_CACHE.clear()
+    for path, content in zip(paths, contents):
+        _MD_FILES.setdefault(_markdown_group(path), {})[path] = content
+
+    _MD_LOADED = True
+
+
+def _refresh_markdown_file(path: Path):
+    """Re-read a single markdown file into the cache, or drop it if it is gone."""
+    group = _markdown_group(path)
+    if group is None:
+        return
+
+    content = _read_markdown_file(path) if path.is_file() else None
+    with _MD_LOCK:
+        if content is None:
+            _MD_FILES.get(group, {}).pop(path, None)
+        else:
+            _MD_FILES.setdefault(group, {})[path] = content
+        _CTX_CACHE.clear()
+
+
+def _forget_markdown_path(path: Path):
+    """Drop a deleted file, or every cached file under a deleted directory."""
+    with _MD_LOCK:
+        removed = False
+        for files in _MD_FILES.values():
+            for p in [p for p in files if p == path or path in p.parents]:
+                del files[p]
+                removed = True
+        if removed:
+            _CTX_CACHE.clear()
+
+
+class MarkdownWatcher(FileSystemEventHandler):
+    """Keep the markdown cache in sync with changes on disk."""
+
+    def __init__(self, observer: Observer):
+        super().__init__()
+        self.observer = observer
+
+    def on_created(self, event):
+        _discover_md_files.cache_clear()
+        if event.is_directory:
+            self._watch_new_served_dir(Path(event.src_path))
+        else:
+            _refresh_markdown_file(Path(event.src_path))
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            _refresh_markdown_file(Path(event.src_path))
+
+    def on_deleted(self, event):
+        _discover_md_files.cache_clear()
+        _forget_markdown_path(Path(event.src_path))
+
+    def on_moved(self, event):
+        _discover_md_files.cache_clear()
+        _forget_markdown_path(Path(event.src_path))
+        if event.is_directory:
+            self._watch_new_served_dir(Path(event.dest_path))
+        else:
+            _refresh_markdown_file(Path(event.dest_path))
+
+    def _watch_new_served_dir(self, path: Path):
+        """Start watching a served directory that appeared after startup, and load its files."""
+        if path.parent != PROJECT_ROOT or path.name not in _served_dirs():
+            return
+        self.observer.schedule(self, str(path), recursive=True)
+        for md_file in path.glob("**/*.md"):
+            _refresh_markdown_file(md_file)
+
+
+def start_markdown_watcher() -> Observer:
+    """Start watching the project for markdown changes, then load all markdown files.
+
+    Only the project root (non-recursively, for root markdown files) and the
+    served directories are watched, so .git, virtualenvs and unrelated trees
+    never use up watches or generate events. The observer starts before the
+    initial load so no edit made during startup is missed. If the watcher
+    cannot start, the cache is still loaded but only refreshed by edit_file.
+    """
+    observer = Observer()
+    handler = MarkdownWatcher(observer)
+    observer.schedule(handler, str(PROJECT_ROOT), recursive=False)
+    for proj_dir in _served_dirs():
+        proj_path = PROJECT_ROOT / proj_dir
+        if proj_path.is_dir():
+            observer.schedule(handler, str(proj_path), recursive=True)
+    observer.daemon = True
+    try:
+        observer.start()
+    except OSError as e:
+        print(f"Could not watch project for markdown changes: {e}")
+
+    with _MD_LOCK:
+        _load_markdown_files()
+
+    return observer
+
+
+def get_all_markdown_files(allowed_dirs: list = None) -> tuple:
+    """Read all markdown files from the project, one "## File: ..." section per file.
+
+    Contents come from the in-memory cache maintained by the markdown
+    watcher, so no disk I/O happens here once the cache is loaded. Only the
+    allowed directories are visited.
+
+    Args:
+        allowed_dirs: List of directory names to include. None means all directories.
+    """
+    cache_key = ("*",) if allowed_dirs is None else tuple(sorted(allowed_dirs))
+
+    with _MD_LOCK:
+        if not _MD_LOADED:
+            _load_markdown_files()
+
+        cached = _CTX_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # (title, content) for every visible file, in display order
+        files = []
+
+        # Markdown files from root (only if full access)
+        if allowed_dirs is None:
+            root_files = _MD_FILES.get("", {})
+            for md_file in sorted(root_files):
+                files.append((md_file.name, root_files[md_file]))
+
+        # Markdown files from each allowed directory, named after its project if it has one
+        dirs_to_read = allowed_dirs if allowed_dirs is not None else list(PROJECTS)
+        for proj_dir in dirs_to_read:
+            proj_name = PROJECTS.get(proj_dir, proj_dir)
+            proj_files = _MD_FILES.get(proj_dir, {})
+            for md_file in sorted(proj_files):
+                files.append((f"{md_file.relative_to(PROJECT_ROOT)} ({proj_name})", proj_files[md_file]))
+
+        # Stop once the context budget is used up
+        sections = []
+        total_chars = 0
+        for i, (title, content) in enumerate(files):
+            total_chars += len(content)
+            if total_chars > MAX_CONTEXT_CHARS:
+                sections.append(f"## Omitted files\n\n{len(files) - i} more files were left out to stay within the context size limit.")
+                break
+            sections.append(f"## File: {title}\n\n{content}")
+
+        sections = tuple(sections)
+        _CTX_CACHE[cache_key] = sections
+        return sections
 
 
 def edit_file(file_path: str, find_text: str, replace_text: str, allowed_dirs: list = None) -> str:
@@ -181,69 +414,203 @@ def edit_file(file_path: str, find_text: str, replace_text: str, allowed_dirs: l
 
     content = full_path.read_text()
 
-    if find_text not in content:
+    idx = content.find(find_text)
+    if idx < 0:
         return f"Error: Could not find the specified text in '{file_path}'. Make sure it matches exactly."
 
-    new_content = content.replace(find_text, replace_text, 1)
-    full_path.write_text(new_content)
+    new_content = content[:idx] + replace_text + content[idx + len(find_text):]
+
+    # Write to a uniquely named temporary file next to the real file (through any
+    # symlink) and swap it in, so a crash never leaves a partial file
+    target = full_path.resolve()
+    tmp = tempfile.NamedTemporaryFile("w", dir=target.parent, prefix=f".{target.name}.", suffix=".tmp", delete=False)
+    try:
+        with tmp:
+            tmp.write(new_content)
+        shutil.copymode(target, tmp.name)
+        os.replace(tmp.name, target)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+    _refresh_markdown_file(full_path)
 
     return f"Updated '{file_path}': replaced text successfully."
 
 
-def get_recent_updates(days: int = 7) -> str:
-    """Get git history of recent project changes."""
+# Upper bound on commits read by get_recent_updates, keeps huge histories cheap
+MAX_LOG_COMMITS = 500
+
+
+def _open_git_repo():
+    """Open the project's git repository with pygit2, or None to fall back to the git CLI.
+
+    Called once per get_recent_updates call: those run on worker threads, and a
+    libgit2 repository handle must not be used from several threads at once.
+    """
+    if pygit2 is None:
+        return None
     try:
-        since_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+        repo = pygit2.Repository(str(PROJECT_ROOT))
+    except pygit2.GitError:
+        return None
+    return None if repo.is_bare else repo
 
-        # Get commit log with files changed
-        log_result = subprocess.run(
-            ["git", "log", f"--since={since_date}", "--pretty=format:%h|%s|%ad", "--date=short", "--name-only"],
-            cwd=PROJECT_ROOT,
-            capture_output=True,
-            text=True
-        )
 
-        if log_result.returncode != 0:
-            return f"Error running git log: {log_result.stderr}"
+# How often to refresh git's commit-graph while the bot is running
+COMMIT_GRAPH_INTERVAL = 6 * 60 * 60  # 6 hours in seconds
 
-        if not log_result.stdout.strip():
-            return f"No commits found in the last {days} days."
 
-        # Get summary stats
-        stat_result = subprocess.run(
-            ["git", "log", f"--since={since_date}", "--pretty=format:", "--shortstat"],
-            cwd=PROJECT_ROOT,
-            capture_output=True,
-            text=True
-        )
+def write_commit_graph():
+    """Write git's commit-graph file and schedule the next refresh.
 
-        # Count commits
-        count_result = subprocess.run(
-            ["git", "rev-list", "--count", f"--since={since_date}", "HEAD"],
+    The commit-graph (with changed-path Bloom filters) speeds up history walks
+    and pathspec filtering for both git log and libgit2. Failures are non-fatal.
+    """
+    try:
+        subprocess.run(
+            ["git", "commit-graph", "write", "--reachable", "--changed-paths"],
             cwd=PROJECT_ROOT,
             capture_output=True,
-            text=True
+            check=False
         )
-        commit_count = count_result.stdout.strip() if count_result.returncode == 0 else "unknown"
+    except OSError as e:
+        print(f"Could not write commit-graph: {e}")
 
-        # Get list of all unique files changed
-        files_result = subprocess.run(
-            ["git", "log", f"--since={since_date}", "--pretty=format:", "--name-only"],
-            cwd=PROJECT_ROOT,
-            capture_output=True,
-            text=True
-        )
-        unique_files = set(f for f in files_result.stdout.strip().split("\n") if f)
+    schedule_commit_graph_write(COMMIT_GRAPH_INTERVAL)
+
+
+def schedule_commit_graph_write(delay: float):
+    """Run write_commit_graph on a daemon timer thread after delay seconds."""
+    timer = threading.Timer(delay, write_commit_graph)
+    timer.daemon = True
+    timer.start()
+
+
+# "%h|%s|%ad" commit header lines in raw git log output (subjects may contain "|")
+_COMMIT_HEADER_RE = re.compile(rb"^[0-9a-f]{7,40}\|.*\|\d{4}-\d{2}-\d{2}$", re.M)
+
+
+def _git_log_pygit2(repo, since: datetime, allowed_dirs: list = None) -> tuple:
+    """Walk recent commits with libgit2, without spawning git.
+
+    Returns a list of (header, files) tuples, newest first, and whether the
+    list was truncated at MAX_LOG_COMMITS.
+    """
+    commits = []
+    if repo.head_is_unborn:
+        return commits, False
+
+    # Delta paths are relative to the repository root, which may sit above PROJECT_ROOT
+    prefixes = None
+    if allowed_dirs is not None:
+        root_prefix = PROJECT_ROOT.resolve().relative_to(Path(repo.workdir).resolve())
+        prefixes = tuple((root_prefix / d).as_posix() + "/" for d in allowed_dirs)
+
+    cutoff = since.timestamp()
+    for commit in repo.walk(repo.head.target, pygit2.GIT_SORT_TIME):
+        if commit.commit_time < cutoff:
+            break
+        # Match git log --no-merges
+        if len(commit.parents) > 1:
+            continue
+
+        # Only changed file names are needed, not the patch text
+        if commit.parents:
+            diff = repo.diff(commit.parents[0], commit)
+        else:
+            diff = commit.tree.diff_to_tree(swap=True)
+        files = [delta.new_file.path for delta in diff.deltas]
+        if prefixes is not None:
+            files = [f for f in files if f.startswith(prefixes)]
+            if not files:
+                continue
+
+        if len(commits) == MAX_LOG_COMMITS:
+            return commits, True
+
+        summary = commit.message.strip().split("\n\n", 1)[0].replace("\n", " ")
+        author_tz = timezone(timedelta(minutes=commit.author.offset))
+        date = datetime.fromtimestamp(commit.author.time, author_tz).strftime("%Y-%m-%d")
+        commits.append((f"{commit.short_id}|{summary}|{date}", files))
+
+    return commits, False
+
+
+def _git_log_subprocess(since: datetime, allowed_dirs: list = None) -> tuple:
+    """Read recent commits from the git CLI.
+
+    Returns the same (commits, truncated) pair as _git_log_pygit2.
+    """
+    # Skip merges and rename detection, and limit the walk to the channel's directories.
+    # Ask for one commit past the cap so we can tell whether output was truncated.
+    cmd = ["git", "log", f"--since={since.isoformat()}", f"--max-count={MAX_LOG_COMMITS + 1}",
+           "--no-merges", "--no-renames", "--pretty=format:%h|%s|%ad", "--date=short", "--name-only"]
+    if allowed_dirs is not None:
+        cmd += ["--", *allowed_dirs]
+
+    # --max-count bounds the output, so read it in one go and parse the raw bytes
+    with subprocess.Popen(cmd, cwd=PROJECT_ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proc:
+        output, stderr = proc.communicate()
+
+    if proc.returncode != 0:
+        raise RuntimeError(stderr.decode("utf-8", "replace"))
+
+    # Everything between one header and the next is that commit's file list
+    headers = list(_COMMIT_HEADER_RE.finditer(output))
+    commits = []
+    for i, header in enumerate(headers[:MAX_LOG_COMMITS]):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(output)
+        files = output[header.end():end].split(b"\n")
+        commits.append((
+            header.group().decode("utf-8", "replace"),
+            [f.decode("utf-8", "replace") for f in files if f]
+        ))
+
+    return commits, len(headers) > MAX_LOG_COMMITS
+
+
+def get_recent_updates(days: int = 7, allowed_dirs: list = None) -> str:
+    """Get git history of recent project changes.
+
+    Uses pygit2 when it is installed and falls back to the git CLI otherwise.
+
+    Args:
+        days: Number of days to look back.
+        allowed_dirs: List of directory names to limit history to. None means all directories.
+    """
+    # A channel restricted to no directories has no history to see. Bail out before
+    # git, which would treat an empty pathspec as the whole repository.
+    if allowed_dirs is not None and not allowed_dirs:
+        return f"No commits found in the last {days} days."
+
+    try:
+        # Both history readers use this exact instant as the cutoff
+        since = (datetime.now() - timedelta(days=days)).replace(microsecond=0)
+
+        repo = _open_git_repo()
+        if repo is not None:
+            commits, truncated = _git_log_pygit2(repo, since, allowed_dirs)
+        else:
+            commits, truncated = _git_log_subprocess(since, allowed_dirs)
+
+        if not commits:
+            return f"No commits found in the last {days} days."
+
+        unique_files = set(f for _, files in commits for f in files)
 
         # Build response
         response = f"Git history for the last {days} days:\n\n"
-        response += f"Total commits: {commit_count}\n"
+        response += f"Total commits: {len(commits)}\n"
         response += f"Files modified: {len(unique_files)}\n\n"
+        if truncated:
+            response += f"(Showing the most recent {MAX_LOG_COMMITS} commits)\n\n"
         response += "Commits:\n"
-        response += log_result.stdout
+        response += "\n\n".join("\n".join([header, *files]) for header, files in commits)
 
         return response
 
+    except RuntimeError as e:
+        return f"Error running git log: {e}"
     except Exception as e:
         return f"Error getting git history: {str(e)}"
 
@@ -258,7 +625,7 @@ def execute_tool(tool_name: str, tool_input: dict, allowed_dirs: list = None) ->
             allowed_dirs
         )
     elif tool_name == "get_recent_updates":
-        return get_recent_updates(tool_input.get("days", 7))
+        return get_recent_updates(tool_input.get("days", 7), allowed_dirs)
     else:
         return f"Unknown tool: {tool_name}"
 
@@ -267,54 +634,73 @@ def get_session(channel_id: str) -> dict:
     """Get or create a session for a channel, clearing if expired."""
     now = time.time()
 
-    # Clean up expired sessions
-    expired = [cid for cid, session in SESSIONS.items()
-               if now - session["last_activity"] > SESSION_TIMEOUT]
-    for cid in expired:
-        del SESSIONS[cid]
+    # Clean up expired sessions. Entries for sessions touched again since
+    # they were pushed are stale and skipped.
+    while _SESSION_EXPIRY and _SESSION_EXPIRY[0][0] < now:
+        _, cid = heapq.heappop(_SESSION_EXPIRY)
+        session = SESSIONS.get(cid)
+        if session is not None and now - session["last_activity"] > SESSION_TIMEOUT:
+            del SESSIONS[cid]
 
     # Get or create session
     if channel_id not in SESSIONS or now - SESSIONS[channel_id]["last_activity"] > SESSION_TIMEOUT:
-        SESSIONS[channel_id] = {"messages": [], "last_activity": now}
+        # One extra slot: the new user turn is appended while the deque is full, and an
+        # odd cap makes it evict an assistant turn so history always starts with a user turn
+        SESSIONS[channel_id] = {"messages": deque(maxlen=SESSION_MAX_MESSAGES + 1), "last_activity": now}
     else:
         SESSIONS[channel_id]["last_activity"] = now
+    heapq.heappush(_SESSION_EXPIRY, (now + SESSION_TIMEOUT, channel_id))
 
     return SESSIONS[channel_id]
 
 
-def ask_claude(user_message: str, channel_id: str) -> str:
-    """Send a message to Claude and get a response, handling tool use."""
-    session = get_session(channel_id)
-    allowed_dirs = get_allowed_dirs(channel_id)
-    project_context = get_all_markdown_files(allowed_dirs)
+@functools.lru_cache(maxsize=16)
+def build_system_prompt(sections: tuple) -> list:
+    """Build the system prompt blocks for a set of markdown file sections.
 
-    # Build context message (only include files on first message or if session is empty)
-    if not session["messages"]:
-        context_message = f"""Here are the current project files:
+    Each file is its own text block. Prompt cache breakpoints are spread
+    evenly across the files (the last file always gets one), so editing a
+    file only invalidates the cached prefix from the breakpoint before it
+    onward instead of the whole context. Memoized because
+    get_all_markdown_files returns the same cached tuple until a file changes.
+    """
+    if not sections:
+        return [_SYSTEM_PROMPT_BLOCK, _PROJECT_FILES_BLOCK, _NO_FILES_BLOCK]
 
-{project_context}
+    count = len(sections)
+    breakpoints = {-(-count * i // MAX_CACHE_BREAKPOINTS) - 1 for i in range(1, MAX_CACHE_BREAKPOINTS + 1)}
 
----
+    blocks = [_SYSTEM_PROMPT_BLOCK, _PROJECT_FILES_BLOCK]
+    for i, section in enumerate(sections):
+        block = {"type": "text", "text": section}
+        if i in breakpoints:
+            block["cache_control"] = {"type": "ephemeral"}
+        blocks.append(block)
+    return blocks
 
-User request: {user_message}"""
-    else:
-        # Subsequent messages just reference the files are still available
-        context_message = f"""(Project files still available from earlier in conversation)
 
-User request: {user_message}"""
+async def ask_claude(user_message: str, channel_id: str) -> str:
+    """Send a message to Claude and get a response, handling tool use."""
+    session = get_session(channel_id)
+    allowed_dirs = get_allowed_dirs(channel_id)
+    project_files = get_all_markdown_files(allowed_dirs)
 
-    # Add user message to session
-    session["messages"].append({"role": "user", "content": context_message})
+    # Project files are provided through the system prompt only, so the
+    # session just keeps the raw user message
+    session["messages"].append({"role": "user", "content": user_message})
 
     # Use session messages for context
-    messages = session["messages"].copy()
+    messages = list(session["messages"])
+
+    # Build the system prompt once and reuse it across the tool use loop
+    system_prompt = build_system_prompt(project_files)
 
     try:
         # Initial request
-        response = claude.messages.create(
+        response = await claude.messages.create(
             model="claude-sonnet-4-5-20250929",
             max_tokens=1024,
-            system=SYSTEM_PROMPT + f"\n\nCurrent project files:\n{project_context}",
+            system=system_prompt,
             tools=TOOLS,
             messages=messages
         )
@@ -326,7 +712,8 @@ User request: {user_message}"""
 
             for block in response.content:
                 if block.type == "tool_use":
-                    tool_result = execute_tool(block.name, block.input, allowed_dirs)
+                    # Tools do blocking disk and git work, keep it off the event loop
+                    tool_result = await asyncio.to_thread(execute_tool, block.name, block.input, allowed_dirs)
                     tool_results.append({
                         "type": "tool_result",
                         "tool_use_id": block.id,
@@ -336,10 +723,10 @@ User request: {user_message}"""
             messages.append({"role": "assistant", "content": assistant_content})
             messages.append({"role": "user", "content": tool_results})
 
-            response = claude.messages.create(
+            response = await claude.messages.create(
                 model="claude-sonnet-4-5-20250929",
                 max_tokens=1024,
-                system=SYSTEM_PROMPT + f"\n\nCurrent project files:\n{project_context}",
+                system=system_prompt,
                 tools=TOOLS,
                 messages=messages
             )
@@ -354,13 +741,10 @@ User request: {user_message}"""
         if response_text is None:
             response_text = "I completed the action but have no additional message."
 
-        # Save assistant response to session (simplified version)
+        # Save assistant response to session (simplified version).
+        # The deque drops the oldest messages once the session is full.
         session["messages"].append({"role": "assistant", "content": response_text})
 
-        # Keep session from growing too large (last 20 exchanges)
-        if len(session["messages"]) > 40:
-            session["messages"] = session["messages"][-40:]
-
         return response_text
 
     except Exception as e:
@@ -368,25 +752,25 @@ User request: {user_message}"""
 
 
 @app.event("app_mention")
-def handle_mention(event, say, client):
+async def handle_mention(event, say, client):
     """Handle @bot mentions in channels."""
     user_message = event.get("text", "").split(">", 1)[-1].strip()
     channel = event.get("channel")
     if user_message:
         # Show typing indicator
-        thinking_msg = client.chat_postMessage(channel=channel, text="_Thinking..._")
+        thinking_msg = await client.chat_postMessage(channel=channel, text="_Thinking..._")
 
-        response = ask_claude(user_message, channel)
+        response = await ask_claude(user_message, channel)
 
         # Delete thinking message and post response
-        client.chat_delete(channel=channel, ts=thinking_msg["ts"])
-        say(response)
+        await client.chat_delete(channel=channel, ts=thinking_msg["ts"])
+        await say(response)
     else:
-        say("Hi! Ask me anything about your project.")
+        await say("Hi! Ask me anything about your project.")
 
 
 @app.event("message")
-def handle_dm(event, say, client):
+async def handle_dm(event, say, client):
     """Handle direct messages to the bot."""
     if event.get("bot_id") or event.get("channel_type") != "im":
         return
@@ -395,13 +779,19 @@ def handle_dm(event, say, client):
     channel = event.get("channel")
     if user_message:
         # Show typing indicator
-        thinking_msg = client.chat_postMessage(channel=channel, text="_Thinking..._")
+        thinking_msg = await client.chat_postMessage(channel=channel, text="_Thinking..._")
 
-        response = ask_claude(user_message, channel)
+        response = await ask_claude(user_message, channel)
 
         # Delete thinking message and post response
-        client.chat_delete(channel=channel, ts=thinking_msg["ts"])
-        say(response)
+        await client.chat_delete(channel=channel, ts=thinking_msg["ts"])
+        await say(response)
+
+
+async def start_socket_mode():
+    """Connect to Slack over Socket Mode and serve events until stopped."""
+    handler = AsyncSocketModeHandler(app, os.environ.get("SLACK_APP_TOKEN"))
+    await handler.start_async()
 
 
 def main():
@@ -410,13 +800,19 @@ def main():
     print(f"Project root: {PROJECT_ROOT}")
     print(f"Projects: {list(PROJECTS.keys())}")
 
-    md_files = list(PROJECT_ROOT.glob("**/*.md"))
+    # Start watching before discovering files, so nothing created in between is missed.
+    # The count below reuses the discovery from the initial load.
+    start_markdown_watcher()
+
+    md_files = _discover_md_files()
     print(f"Found {len(md_files)} markdown files")
     print("Tools: edit_file, get_recent_updates")
 
-    handler = SocketModeHandler(app, os.environ.get("SLACK_APP_TOKEN"))
+    # The first write can take minutes on a large repo, so don't block the Slack connection on it
+    schedule_commit_graph_write(0)
+
     print("Bot is running! Press Ctrl+C to stop.")
-    handler.start()
+    asyncio.run(start_socket_mode())
 
 
 if __name__ == "__main__":